@@ -15,23 +15,35 @@ Parameters:
 - `semantic_search`: Configuration settings related to the semantic search, including query settings and rerank parameters.
 
 Functions:
-- `run_crossmap`: Orchestrates the crossmapping process by setting up the service context,
-  loading vector store indices, creating query engines, performing semantic search, and reranking results.
+- `search_collection`: Queries a ChromaDB collection directly with a batch of query vectors.
+- `embed_queries`: Embeds the (variable, column) queries, encoding each distinct text once per run.
+- `search_candidates`: Retrieves the bi-encoder candidates of each collection for embedded queries.
+- `process_column`: Reranks one column's candidates and joins them onto the query variables.
+- `rerank_columns`: Runs `process_column` for every column concurrently.
+- `run_pipeline`: Runs embedding, search and reranking as a three-stage pipeline over windows of queries.
+- `run_crossmap`: Orchestrates the crossmapping process by setting up the embedding and rerank models,
+  loading vector store collections, performing batched semantic search, and reranking results.
 
 Execution:
 Run the script from the command line after ensuring the configuration file is set:
 
     python batch_crossmap_dd.py
 
-The script outputs a CSV file with the crossmapping results and updates the configuration with the output paths.
+The script outputs a parquet file (and, unless `export_csv` is disabled, a CSV file) with the crossmapping
+results and updates the configuration with the output paths.
 
 The crossmapping process includes the following steps:
 - Loading and preprocessing the input data dictionary CSV.
-- Setting up the embedding model and global service context for the LlamaIndex.
-- Creating query engines for each collection specified in the ChromaDB vector store.
-- Conducting semantic searches across the collections for each variable in the user's data dictionary.
-- Applying a cross-encoder reranking process to refine the search results.
-- Saving the crossmapping results to a CSV file and persisting the updated configuration.
+- Setting up the embedding and cross-encoder models.
+- Loading each collection specified in the ChromaDB vector store.
+- Embedding the variables of the user's data dictionary in windows of `semantic_search.query.window_size`
+  queries and querying each collection with a window's query vectors at once, pipelined with the
+  reranking of the previous windows.
+- Caching the retrieved candidates to parquet so reranking can be rerun without re-embedding
+  (`semantic_search.query.reuse_candidates`).
+- Applying a cross-encoder reranking process to refine the search results, with the columns processed
+  concurrently (optionally across several devices via `rerank.cross_encoder.devices`).
+- Saving the crossmapping results to parquet (and optionally CSV) and persisting the updated configuration.
 """
 
 
@@ -39,32 +51,27 @@ import pandas as pd
 import torch
 from tqdm import tqdm
 import numpy as np
-import pickle
+from omegaconf import OmegaConf
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# Importing necessary modules for language embeddings and LlamaIndex framework.
-from langchain.embeddings.huggingface import HuggingFaceEmbeddings
-from llama_index import (
-    LangchainEmbedding,
-    Document,
-    VectorStoreIndex,
-    StorageContext,
-    ServiceContext,
-    get_response_synthesizer,
-)
-from llama_index.retrievers import VectorIndexRetriever
-from llama_index.query_engine import RetrieverQueryEngine
-from llama_index.indices.composability import ComposableGraph
-from llama_index.indices.postprocessor import SentenceTransformerRerank
-from llama_index.vector_stores import ChromaVectorStore
-from llama_index import set_global_service_context
-
-import chromadb
 
 # Importing project-specific utilities for setting up and processing the crossmap.
+from brics_crossmap.data_dictionary.indexing.utils import (
+    LAST_UPDATE_HASH_FILE,
+    batchify,
+    get_chromadb_client,
+)
 from brics_crossmap.data_dictionary.utils.node_operations import (
-    DummyNodePostprocessor,
-    node_results_to_dataframe,
+    chroma_metadata_to_result,
+)
+from brics_crossmap.data_dictionary.utils.embeddings import load_embeddings
+from brics_crossmap.data_dictionary.utils.rerank import (
+    load_cross_encoder,
+    rerank_candidates,
 )
 from brics_crossmap.utils import helper
 from brics_crossmap.data_dictionary import crossmap_logger, log, copy_log
@@ -77,6 +84,350 @@ cfg = helper.compose_config(
 )
 
 
+def candidates_cache_path(df, cfg, collections):
+    """
+    Path of the cached candidate table for the current embedding settings, queries and vector store.
+
+    Args:
+        df (pd.DataFrame): Dataframe containing data dictionary variables to be crossmapped.
+        cfg (configparser.ConfigParser): Configuration object containing settings for crossmapping.
+        collections (dict): ChromaDB collections keyed by collection name.
+
+    Returns:
+        Path: Parquet file path named after a hash of everything the candidates depend on.
+    """
+
+    id_column = cfg.semantic_search.data_dictionary.embed.id_column
+    columns = list(cfg.semantic_search.data_dictionary.embed.columns)
+    storage_path_root = cfg.indices.index.storage_path_root
+    # upserts keep the counts unchanged, so also key on what changes with the contents:
+    # the last applied update and the local store's last write
+    fp_update_hash = Path(storage_path_root, LAST_UPDATE_HASH_FILE)
+    fp_sqlite = Path(storage_path_root, "chroma.sqlite3")
+    key = {
+        # model, backend, dtype, pooling/normalization: anything that moves the query vectors
+        "embed": OmegaConf.to_container(
+            cfg.indices.index.collections.embed, resolve=True
+        ),
+        "similarity_top_k": cfg.semantic_search.query.similarity_top_k,
+        "storage_path_root": storage_path_root,
+        "collections": {col: collections[col].count() for col in columns},
+        "last_update_hash": (
+            fp_update_hash.read_text().strip() if fp_update_hash.is_file() else None
+        ),
+        "store_mtime": fp_sqlite.stat().st_mtime_ns if fp_sqlite.is_file() else None,
+        "queries": df[[id_column, *columns]].to_csv(index=False),
+    }
+    corpus_hash = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    return Path(
+        cfg.semantic_search.data_dictionary.directory_output,
+        "candidates",
+        f"candidates_{corpus_hash[:16]}.parquet",
+    )
+
+
+def search_collection(collection, query_embeddings, n_results):
+    """
+    Query a ChromaDB collection directly with a batch of query vectors.
+
+    Args:
+        collection (chromadb.Collection): Collection to search.
+        query_embeddings (np.ndarray): (N, D) array of query vectors.
+        n_results (int): Number of nearest neighbours to return per query.
+
+    Returns:
+        np.ndarray: Flat array of hit ids for all queries.
+        np.ndarray: Flat array of hit distances for all queries.
+        np.ndarray: Number of hits returned for each query.
+    """
+
+    search_results = collection.query(
+        query_embeddings=query_embeddings.tolist(),
+        n_results=n_results,
+        include=["distances"],
+    )
+    counts = np.array([len(ids) for ids in search_results["ids"]], dtype=int)
+    ids = np.array(
+        [id_ for hits in search_results["ids"] for id_ in hits], dtype=object
+    )
+    distances = np.array(
+        [d for hits in search_results["distances"] for d in hits], dtype=np.float32
+    )
+    return ids, distances, counts
+
+
+def embed_queries(df, cfg, embeddings, known=None):
+    """
+    Embed the (variable, column) query texts, encoding each distinct text only once.
+
+    Args:
+        df (pd.DataFrame): Dataframe containing data dictionary variables to be crossmapped.
+        cfg (configparser.ConfigParser): Configuration object containing settings for crossmapping.
+        embeddings (SentenceTransformerEmbeddings): Embedding model used to embed the queries.
+        known (dict): Query vectors keyed by text, reused and extended by this call so texts
+            seen in earlier windows are not encoded again.
+
+    Returns:
+        List[str]: Query texts, column by column.
+        np.ndarray: (N*C, D) array of query vectors in the same order.
+    """
+
+    known = {} if known is None else known
+    columns = list(cfg.semantic_search.data_dictionary.embed.columns)
+    texts = [text for col in columns for text in df[col].tolist()]
+    # repeated titles/definitions are embedded once and fanned back out per row
+    codes, unique_texts = pd.factorize(
+        pd.Series(texts, dtype=object), use_na_sentinel=False
+    )
+    unique_texts = unique_texts.tolist()
+    missing = [text for text in unique_texts if text not in known]
+    crossmap_logger.info(
+        f"Embedding {len(missing)} new of {len(texts)} queries across {columns}"
+    )
+    if missing:
+        known.update(zip(missing, embeddings.encode(missing)))
+    return texts, np.stack([known[text] for text in unique_texts])[codes]
+
+
+def search_candidates(df, cfg, texts, query_embeddings, collections):
+    """
+    Retrieve the bi-encoder candidates of each collection for embedded (variable, column) queries.
+
+    Args:
+        df (pd.DataFrame): Dataframe containing data dictionary variables to be crossmapped.
+        cfg (configparser.ConfigParser): Configuration object containing settings for crossmapping.
+        texts (List[str]): Query texts from `embed_queries`.
+        query_embeddings (np.ndarray): Query vectors from `embed_queries`.
+        collections (dict): ChromaDB collections keyed by collection name.
+
+    Returns:
+        pd.DataFrame: Candidate table with one row per hit (query_pos, query_id, col, query_text,
+        doc_id, bi_score), where query_pos is the query's row label in df.
+    """
+
+    id_column = cfg.semantic_search.data_dictionary.embed.id_column
+    columns = list(cfg.semantic_search.data_dictionary.embed.columns)
+    variables = df[id_column].to_numpy(dtype=object)
+    positions = df.index.to_numpy()
+    n_queries = len(variables)
+
+    # SEMANTIC SEARCH with each column's query vectors in a single ANN lookup
+    id_chunks, distance_chunks, count_chunks = [], [], []
+    for c, col in enumerate(columns):
+        crossmap_logger.info(f"Querying collection: {col}")
+        ids, distances, counts = search_collection(
+            collections[col],
+            query_embeddings[c * n_queries : (c + 1) * n_queries],
+            cfg.semantic_search.query.similarity_top_k,
+        )
+        id_chunks.append(ids)
+        distance_chunks.append(distances)
+        count_chunks.append(counts)
+
+    # one row per hit, built from flat column arrays in one shot
+    counts = np.concatenate(count_chunks)
+    return pd.DataFrame(
+        {
+            "query_pos": np.repeat(np.tile(positions, len(columns)), counts),
+            "query_id": np.repeat(np.tile(variables, len(columns)), counts),
+            "col": np.repeat(
+                np.repeat(np.array(columns, dtype=object), n_queries), counts
+            ),
+            "query_text": np.repeat(np.array(texts, dtype=object), counts),
+            "doc_id": np.concatenate(id_chunks),
+            "bi_score": 1 - np.concatenate(distance_chunks, dtype=np.float32),
+        }
+    )
+
+
+def fetch_candidate_documents(collection, doc_ids, batch_size):
+    """
+    Fetch the document text and result metadata of candidate ids from a collection.
+
+    Args:
+        collection (chromadb.Collection): Collection the candidates were retrieved from.
+        doc_ids (List[str]): Unique candidate ids.
+        batch_size (int): Number of ids per ChromaDB get request.
+
+    Returns:
+        dict: Document text keyed by id.
+        dict: Result metadata (see `chroma_metadata_to_result`) keyed by id.
+    """
+
+    documents, metadatas = {}, {}
+    for batch in batchify(doc_ids, batch_size):
+        fetched = collection.get(ids=batch, include=["documents", "metadatas"])
+        for id_, document, metadata in zip(
+            fetched["ids"], fetched["documents"], fetched["metadatas"]
+        ):
+            documents[id_] = document
+            metadatas[id_] = chroma_metadata_to_result(metadata)
+    return documents, metadatas
+
+
+def process_column(df, cfg, df_candidates, collection, col, cross_encoder, lock):
+    """
+    Rerank the cached candidates of one column and join them onto the query variables.
+
+    Args:
+        df (pd.DataFrame): Data dictionary variables being crossmapped.
+        cfg (configparser.ConfigParser): Configuration object containing settings for crossmapping.
+        df_candidates (pd.DataFrame): Candidate table from `search_candidates`.
+        collection (chromadb.Collection): Collection the column's candidates were retrieved from.
+        col (str): Embed column / collection name.
+        cross_encoder (CrossEncoder): Cross-encoder used for reranking.
+        lock (threading.Lock): Serializes use of the cross-encoder between column threads.
+
+    Returns:
+        pd.DataFrame: Query variables with their reranked results for this column.
+    """
+
+    id_column = cfg.semantic_search.data_dictionary.embed.id_column
+    df_query = df[cfg.semantic_search.data_dictionary.metadata_columns].assign(
+        query_engine=col
+    )
+
+    df_col = df_candidates[df_candidates["col"] == col]
+    documents, metadatas = fetch_candidate_documents(
+        collection,
+        df_col["doc_id"].unique().tolist(),
+        cfg.indices.index.collections.max_batch_size,
+    )
+
+    # candidates are stored contiguously per query; group on the query's row rather than
+    # its variable name, which may repeat
+    query_pos = df_col["query_pos"].to_numpy()
+    query_ids = df_col["query_id"].to_numpy(dtype=object)
+    query_texts = df_col["query_text"].to_numpy(dtype=object)
+    doc_ids = df_col["doc_id"].to_numpy(dtype=object)
+    starts = np.flatnonzero(np.r_[True, query_pos[1:] != query_pos[:-1]])
+    starts = starts[: len(query_pos)]
+
+    # CROSS ENCODER RERANKING of all query/candidate pairs in one pass
+    crossmap_logger.info(f"Reranking candidates for: {col}")
+    with lock:
+        positions, scores = rerank_candidates(
+            cross_encoder,
+            query_texts[starts].tolist(),
+            np.split(
+                np.array([documents[doc_id] for doc_id in doc_ids], dtype=object),
+                starts[1:],
+            ),
+            top_n=cfg.semantic_search.query.rerank.cross_encoder.top_n,
+            batch_size=cfg.semantic_search.query.rerank.get("batch_size"),
+            max_chars=cfg.semantic_search.query.rerank.get("max_chars") or 512,
+        )
+
+    # one row per kept hit, built from flat column arrays in one shot
+    df_meta = pd.DataFrame.from_dict(metadatas, orient="index")
+    df_meta = df_meta.loc[doc_ids[positions]]
+    df_results = pd.DataFrame(
+        {
+            f"{id_column}_query": query_ids[positions],
+            "query_text": query_texts[positions],
+            **{k: df_meta[k].to_numpy() for k in df_meta.columns},
+            "score": scores,
+        },
+        index=query_pos[positions],
+    ).add_suffix("_result")
+    # each query row gets its own hits, even when variable names repeat
+    return pd.merge(
+        df_query, df_results, left_index=True, right_index=True, how="left"
+    ).reset_index(drop=True)
+
+
+def rerank_columns(df, cfg, df_candidates, collections, rerankers):
+    """
+    Rerank the candidates of every column, one thread per column so ChromaDB fetches and
+    frame building overlap the cross-encoder passes.
+
+    Args:
+        df (pd.DataFrame): Data dictionary variables being crossmapped.
+        cfg (configparser.ConfigParser): Configuration object containing settings for crossmapping.
+        df_candidates (pd.DataFrame): Candidate table from `search_candidates`.
+        collections (dict): ChromaDB collections keyed by collection name.
+        rerankers (List[tuple]): (cross-encoder, lock) pairs, assigned to columns round-robin.
+
+    Returns:
+        List[pd.DataFrame]: Reranked results of each column (see `process_column`).
+    """
+
+    columns = list(cfg.semantic_search.data_dictionary.embed.columns)
+    with ThreadPoolExecutor(max_workers=len(columns)) as executor:
+        futures = [
+            executor.submit(
+                process_column,
+                df,
+                cfg,
+                df_candidates,
+                collections[col],
+                col,
+                *rerankers[i % len(rerankers)],
+            )
+            for i, col in enumerate(columns)
+        ]
+        return [future.result() for future in futures]
+
+
+def run_pipeline(df, cfg, embeddings, collections, rerankers):
+    """
+    Embed, search and rerank windows of queries as a three-stage pipeline.
+
+    Each stage runs on its own thread and takes the windows in order, so embedding a window
+    overlaps the ChromaDB search of the previous window and the reranking of the one before it.
+
+    Args:
+        df (pd.DataFrame): Data dictionary variables being crossmapped.
+        cfg (configparser.ConfigParser): Configuration object containing settings for crossmapping.
+        embeddings (SentenceTransformerEmbeddings): Embedding model used to embed the queries.
+        collections (dict): ChromaDB collections keyed by collection name.
+        rerankers (List[tuple]): (cross-encoder, lock) pairs, assigned to columns round-robin.
+
+    Returns:
+        List[pd.DataFrame]: Reranked results of every window and column.
+        pd.DataFrame: Candidate table of all windows.
+    """
+
+    window_size = cfg.semantic_search.query.get("window_size") or len(df)
+    windows = [df.iloc[i : i + window_size] for i in range(0, len(df), window_size)]
+    # only the single embed thread touches this, so texts repeated across windows are
+    # encoded once for the whole run
+    query_vectors = {}
+    with ThreadPoolExecutor(max_workers=1) as embed_stage, ThreadPoolExecutor(
+        max_workers=1
+    ) as search_stage, ThreadPoolExecutor(max_workers=1) as rerank_stage:
+        searched, reranked = [], []
+        for df_window in windows:
+            embedded = embed_stage.submit(
+                embed_queries, df_window, cfg, embeddings, query_vectors
+            )
+            searched.append(
+                search_stage.submit(
+                    lambda w, e: search_candidates(w, cfg, *e.result(), collections),
+                    df_window,
+                    embedded,
+                )
+            )
+            reranked.append(
+                rerank_stage.submit(
+                    lambda w, c: rerank_columns(
+                        w, cfg, c.result(), collections, rerankers
+                    ),
+                    df_window,
+                    searched[-1],
+                )
+            )
+        dfs_curation = [
+            df_result
+            for future in tqdm(reranked, total=len(reranked))
+            for df_result in future.result()
+        ]
+        df_candidates = pd.concat(
+            [future.result() for future in searched], ignore_index=True
+        )
+    return dfs_curation, df_candidates
+
+
 @log(msg="Running Crossmapping on Index")
 def run_crossmap(df, cfg):
     """
@@ -97,113 +448,92 @@ def run_crossmap(df, cfg):
     )
     cfg.semantic_search.data_dictionary.filepath_curation = output_dir.as_posix()
 
-    # Initialize embedding model and service context for semantic search.
-    crossmap_logger.info("Initializing embedding model and service context.")
-    embed_model = LangchainEmbedding(
-        HuggingFaceEmbeddings(
-            model_name=cfg.indices.index.collections.embed.model_name,
-            model_kwargs={},
-            encode_kwargs=cfg.indices.index.collections.embed.model_kwargs,
-        ),
-        embed_batch_size=cfg.indices.index.collections.embed.model_kwargs.batch_size,
-    )
-    service_context = ServiceContext.from_defaults(embed_model=embed_model, llm=None)
-    set_global_service_context(service_context)
-
-    # Load vector store index and create query engines for each collection in the database.
-    crossmap_logger.info("Loading vector store index and creating query engines.")
-    query_engines = {}
-    storage_path_root = cfg.semantic_search.query.storage_path_root
-    db = chromadb.PersistentClient(path=storage_path_root)
-
-    # Iterate through collections to set up query engines.
-    for c in db.list_collections():
-        crossmap_logger.info(f"Loading collection: {c}")
-        collection_name = c.name
-        collection = db.get_or_create_collection(collection_name)
-        crossmap_logger.info(f"{collection_name} count: {collection.count()}")
-
-        # Create Vector Store Index for each collection.
-        vector_store = ChromaVectorStore(chroma_collection=collection)
-        index = VectorStoreIndex.from_vector_store(
-            vector_store=vector_store,
-            service_context=service_context,
-        )
-
-        # Set up the retriever and response synthesizer for querying.
-        retriever = VectorIndexRetriever(
-            index=index,
-            similarity_top_k=cfg.semantic_search.query.similarity_top_k,
-            vector_store_query_mode="text_search",
-        )
-        response_synthesizer = get_response_synthesizer(
-            response_mode="no_text", service_context=service_context
-        )
-
-        # Initialize rerank processor for refining search results.
-        rerank = SentenceTransformerRerank(
-            model=cfg.semantic_search.query.rerank.cross_encoder.model_name,
-            top_n=cfg.semantic_search.query.rerank.cross_encoder.top_n,
+    # Row positions identify the queries, across windows and in the candidate cache.
+    df = df.reset_index(drop=True)
+
+    # Initialize embedding model for semantic search.
+    crossmap_logger.info("Initializing embedding model.")
+    embeddings = load_embeddings(cfg.indices.index.collections.embed)
+
+    # Initialize the cross-encoder used to rerank the candidates of every collection,
+    # one instance per configured device with columns assigned round-robin.
+    crossmap_logger.info("Initializing cross-encoder rerank model.")
+    cross_encoder_cfg = cfg.semantic_search.query.rerank.cross_encoder
+    devices = cross_encoder_cfg.get("devices") or [
+        cross_encoder_cfg.get("device") or "cpu"
+    ]
+    rerankers = [
+        (
+            load_cross_encoder(
+                cross_encoder_cfg.model_name,
+                device=device,
+                torch_dtype=cross_encoder_cfg.get("torch_dtype"),
+            ),
+            threading.Lock(),
         )
-
-        # Configure the query engine with the retriever and postprocessors.
-        query_engine = RetrieverQueryEngine(
-            retriever=retriever,
-            response_synthesizer=response_synthesizer,
-            node_postprocessors=[DummyNodePostprocessor(), rerank],
-        )
-        query_engines[collection_name] = query_engine
-
-    # EMBED + SEMANTIC SEARCH + CROSS ENCODER RERANKING
+        for device in devices
+    ]
+
+    # Load vector store collections for each collection in the database.
+    crossmap_logger.info("Loading vector store collections.")
+    collections = {}
+    # same store (local path or Chroma server) the indexing scripts write to
+    db = get_chromadb_client(cfg.indices.index)
+
+    # Iterate through collections to load them, reusing the listed handles.
+    for collection in db.list_collections():
+        crossmap_logger.info(f"Loading collection: {collection.name}")
+        crossmap_logger.info(f"{collection.name} count: {collection.count()}")
+        collections[collection.name] = collection
+
+    # EMBED + SEMANTIC SEARCH + CROSS ENCODER RERANKING, pipelined over windows of queries,
+    # or rerank the cached candidate table
     crossmap_logger.info(
         "Starting semantic search and cross-encoder reranking process."
     )
-    dfs_curation = []
     id_column = cfg.semantic_search.data_dictionary.embed.id_column
-    for col in tqdm(
-        cfg.semantic_search.data_dictionary.embed.columns,
-        total=len(cfg.semantic_search.data_dictionary.embed.columns),
+    columns = list(cfg.semantic_search.data_dictionary.embed.columns)
+    fp_candidates = candidates_cache_path(df, cfg, collections)
+    if (
+        cfg.semantic_search.query.get("reuse_candidates", False)
+        and fp_candidates.is_file()
     ):
-        # LOAD COLLECTION QUERY ENGINGE
-        query_engine = query_engines[col]
-        # SEMANTIC SEARCH
-        df_results_temp = []
-        df_query = df[cfg.semantic_search.data_dictionary.metadata_columns]
-        df_query["query_engine"] = col
-        for idx, row in tqdm(df.iterrows(), total=df.shape[0]):
-            query = row[col]
-            var = row[id_column]
-            crossmap_logger.info(f"Querying: {var} - {query}")
-            node_results = query_engine.query(query)
-            df_node_results = node_results_to_dataframe(node_results)
-            df_node_results.insert(0, f"{id_column}_query", var)
-            df_node_results.insert(1, "query_text", query)
-            df_results_temp.append(df_node_results)
-        df_results = pd.concat(df_results_temp, axis=0)
-        df_results = df_results.add_suffix("_result")
-        df_curation_temp = pd.merge(
-            df_query,
-            df_results,
-            left_on=id_column,
-            right_on=f"{id_column}_query_result",
-            how="outer",
+        crossmap_logger.info(f"Reusing cached candidates: {fp_candidates}")
+        df_candidates = pd.read_parquet(fp_candidates)
+        dfs_curation = rerank_columns(df, cfg, df_candidates, collections, rerankers)
+    else:
+        dfs_curation, df_candidates = run_pipeline(
+            df, cfg, embeddings, collections, rerankers
+        )
+        fp_candidates.parent.mkdir(parents=True, exist_ok=True)
+        df_candidates.to_parquet(
+            fp_candidates, engine="pyarrow", compression="zstd", index=False
         )
-        dfs_curation.append(df_curation_temp)
+        crossmap_logger.info(f"Cached candidates: {fp_candidates}")
 
+    # hits are already best first within each variable/engine group, so a stable
+    # integer sort on (variable, engine), both descending, orders the whole sheet
     df_curation = pd.concat(dfs_curation, axis=0)
-    df_curation.sort_values(
-        by=[id_column, "query_engine", "score_result"], ascending=False, inplace=True
-    )
-
-    # Save the updated variables DataFrame
-    crossmap_logger.info("Saving crossmapping results to CSV.")
-    df_curation.to_csv(
-        Path(
-            output_dir,
-            f"semantic-search_{cfg.semantic_search.data_dictionary.embed.columns}.csv",
-        ),
+    id_order = np.sort(df[id_column].dropna().unique())[::-1]
+    id_codes = pd.Categorical(df_curation[id_column], categories=id_order).codes
+    engine_codes = pd.Categorical(
+        df_curation["query_engine"], categories=sorted(columns, reverse=True)
+    ).codes
+    id_codes = np.where(id_codes < 0, len(id_order), id_codes)
+    df_curation = df_curation.iloc[np.lexsort((engine_codes, id_codes))]
+
+    # Save the updated variables DataFrame, dictionary-encoded and zstd-compressed
+    crossmap_logger.info("Saving crossmapping results to parquet.")
+    fn_results = f"semantic-search_{cfg.semantic_search.data_dictionary.embed.columns}"
+    df_curation.to_parquet(
+        Path(output_dir, f"{fn_results}.parquet"),
+        engine="pyarrow",
+        compression="zstd",
         index=False,
     )
+    if cfg.semantic_search.data_dictionary.get("export_csv", True):
+        crossmap_logger.info("Saving crossmapping results to CSV.")
+        df_curation.to_csv(Path(output_dir, f"{fn_results}.csv"), index=False)
 
     # SAVE CONFIG
     crossmap_logger.info("Saving updated configuration.")
@@ -1,5 +1,13 @@
 import pandas as pd
 
+# parsed copy of "last change date"; the raw text column stays as Chroma metadata
+PARSED_DATE_COLUMN = "_last change date"
+
+
+def parse_change_dates(dates):
+    """Parse change dates of any ISO/common format to UTC timestamps, NaT where unparseable"""
+    return pd.to_datetime(dates, errors="coerce", utc=True, format="mixed")
+
 
 class DataPreprocessor:
     def __init__(self, cfg):
@@ -8,3 +16,9 @@ class DataPreprocessor:
     def preprocess_data(self, df):
         # Clean the DataFrame based on config settings
         return df.dropna(subset=[self.cfg.indices.index.collections.embed.id_column])
+
+    def parse_dates(self, df):
+        # Parse "last change date" once so the per-collection update checks compare timestamps
+        return df.assign(
+            **{PARSED_DATE_COLUMN: parse_change_dates(df["last change date"])}
+        )
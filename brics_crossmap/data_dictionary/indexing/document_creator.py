@@ -1,3 +1,4 @@
+import numpy as np
 from llama_index.node_parser import SimpleNodeParser
 from llama_index import Document
 
@@ -11,11 +12,19 @@ class DocumentCreator:
 
     def create_documents_by_column(self, df, column):
         documents = []
-        metadata_cols = self.cfg.indices.index.collections.metadata_columns
+        metadata_cols = list(self.cfg.indices.index.collections.metadata_columns)
+        # skip rows with nothing to embed in this column; their other columns still index
+        df = df[df[column].fillna("").str.strip().ne("")]
 
-        for _, row in df.iterrows():
-            doc = row[column]
-            meta = {val: row[val] for val in metadata_cols}
+        # pull each column out as a plain list once and zip over them row by row;
+        # missing values as NaN, Chroma rejects None/pd.NA metadata
+        texts = df[column].tolist()
+        meta_values = [
+            df[m].to_numpy(dtype=object, na_value=np.nan).tolist()
+            for m in metadata_cols
+        ]
+        for doc, *values in zip(texts, *meta_values):
+            meta = dict(zip(metadata_cols, values))
             documents.append(
                 Document(
                     text=doc,
@@ -1,8 +1,14 @@
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
 from llama_index import (
     VectorStoreIndex,
     ServiceContext,
-    StorageContext,
     LangchainEmbedding,
     set_global_service_context,
 )
@@ -10,84 +16,142 @@ from llama_index.node_parser import SimpleNodeParser
 from llama_index.vector_stores import ChromaVectorStore
 from llama_index.vector_stores.utils import node_to_metadata_dict
 from llama_index.schema import MetadataMode
-from langchain.embeddings.huggingface import HuggingFaceEmbeddings
 
 import chromadb
-from chromadb.utils import embedding_functions
 
+from brics_crossmap.data_dictionary.indexing import indexing_logger
 from brics_crossmap.data_dictionary.indexing.utils import batchify
+from brics_crossmap.data_dictionary.utils.embeddings import (
+    ChromaEmbeddingFunction,
+    load_embeddings,
+)
 
 
 class Indexer:
     def __init__(self, cfg, client):
         self.cfg = cfg
         self.client = client
+        self.collections = {}
         self.service_context = self.initialize_service_context()
 
     def initialize_service_context(self):
+        # One embedding model shared by LlamaIndex and the ChromaDB collections
+        embeddings = load_embeddings(self.cfg.indices.index.collections.embed)
+        self.embed_batch_size = embeddings.batch_size
         embed_model = LangchainEmbedding(
-            HuggingFaceEmbeddings(
-                model_name=self.cfg.indices.index.collections.embed.model_name,
-                model_kwargs={},
-                encode_kwargs=self.cfg.indices.index.collections.embed.model_kwargs,
-            ),
-            embed_batch_size=self.cfg.indices.index.collections.embed.model_kwargs.batch_size,
+            embeddings, embed_batch_size=self.embed_batch_size
         )
         service_context = ServiceContext.from_defaults(
             embed_model=embed_model, llm=None
         )
         set_global_service_context(service_context)
-        self.embedding_function = (
-            embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name=self.cfg.indices.index.collections.embed.model_name
-            )
-        )
+        self.embedding_function = ChromaEmbeddingFunction(embeddings)
         return service_context
 
-    def add_nodes(self, nodes, collection_name):
-        collection = self.client.get_or_create_collection(
-            collection_name,
-            metadata=dict(self.cfg.indices.index.collections.distance_metric),
-            embedding_function=self.embedding_function,
-        )
-
-        vector_store = ChromaVectorStore(collection)
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    def get_collection(self, collection_name):
+        # Reuse collection handles across add/update calls
+        if collection_name not in self.collections:
+            self.collections[collection_name] = self.client.get_or_create_collection(
+                collection_name,
+                metadata=dict(self.cfg.indices.index.collections.distance_metric),
+                embedding_function=self.embedding_function,
+            )
+        return self.collections[collection_name]
 
-        # Index nodes in batches
-        for batch in batchify(nodes, self.cfg.indices.index.collections.max_batch_size):
-            index = VectorStoreIndex(
-                batch,
-                storage_context=storage_context,
-                service_context=self.service_context,
-                show_progress=True,
+    def prepare_nodes(self, nodes):
+        # Serialize every node once into column lists: ids, embed text, flat metadata, documents
+        ids = [None] * len(nodes)
+        texts = [None] * len(nodes)
+        metadatas = [None] * len(nodes)
+        documents = [None] * len(nodes)
+        for i, n in enumerate(nodes):
+            ids[i] = n.node_id
+            texts[i] = n.get_content(metadata_mode=MetadataMode.EMBED)
+            metadatas[i] = node_to_metadata_dict(
+                n, remove_text=True, flat_metadata=True
             )
+            documents[i] = n.get_content(metadata_mode=MetadataMode.NONE)
+        return ids, texts, metadatas, documents
+
+    def upsert_batch(self, collection, ids, embeddings, metadatas, documents):
+        # Write a batch of nodes with precomputed embeddings straight to ChromaDB
+        collection.upsert(
+            ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents
+        )
 
-            # Persist each batch
-            storage_path_index = Path(
-                self.cfg.indices.index.storage_path_root
-            ).as_posix()
-            index.storage_context.persist(storage_path_index)
+    def write_nodes(self, collection, nodes):
+        # Embed windows on this thread while writer threads upsert previous batches
+        batch_size = self.cfg.indices.index.collections.max_batch_size
+        workers = self.cfg.indices.index.collections.get("upsert_workers") or 4
+        # embed at least a full model batch per call even when upserts must be smaller
+        window_size = max(batch_size, self.embed_batch_size)
+        ids, texts, metadatas, documents = self.prepare_nodes(nodes)
+        codes, unique_texts = pd.factorize(pd.Series(texts, dtype=object))
+        # group similar-length texts into the same batch to cut padding in the embedder,
+        # with identical texts next to each other so each is embedded once
+        order = np.lexsort((codes, [len(text) for text in texts]))
+        embedded = {}
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for window in tqdm(
+                batchify(order, window_size),
+                total=math.ceil(len(nodes) / window_size),
+            ):
+                window_codes = codes[window].tolist()
+                missing = [c for c in dict.fromkeys(window_codes) if c not in embedded]
+                vectors = self.service_context.embed_model.get_text_embedding_batch(
+                    [unique_texts[c] for c in missing]
+                )
+                # duplicates are adjacent, so only the previous window's vectors can recur
+                embedded = {
+                    **{c: embedded[c] for c in window_codes if c in embedded},
+                    **dict(zip(missing, vectors)),
+                }
+                embeddings = [embedded[c] for c in window_codes]
+                for start in range(0, len(window), batch_size):
+                    batch = window[start : start + batch_size]
+                    # bound the embedded batches waiting on a writer
+                    if len(in_flight) >= workers + 2:
+                        in_flight.popleft().result()
+                    in_flight.append(
+                        executor.submit(
+                            self.upsert_batch,
+                            collection,
+                            [ids[i] for i in batch],
+                            embeddings[start : start + batch_size],
+                            [metadatas[i] for i in batch],
+                            [documents[i] for i in batch],
+                        )
+                    )
+            while in_flight:
+                in_flight.popleft().result()
 
-    def update_nodes(self, nodes, collection_name):
-        collection = self.client.get_or_create_collection(
-            collection_name,
-            metadata=dict(self.cfg.indices.index.collections.distance_metric),
-            embedding_function=self.embedding_function,
+    def add_nodes(self, nodes, collection_name, persist=True):
+        collection = self.get_collection(collection_name)
+        start = time.perf_counter()
+        self.write_nodes(collection, nodes)
+        indexing_logger.info(
+            f"Wrote {len(nodes)} nodes to '{collection_name}' in {time.perf_counter() - start:.1f}s"
         )
+        # Callers streaming several chunks into a collection persist once at the end
+        if persist:
+            self.persist_index(collection_name)
 
-        metadatas = []
-        ids = []
-        documents = []
-        for n in nodes:
-            id_ = n.id_
-            metadata = node_to_metadata_dict(n, remove_text=True, flat_metadata=True)
-            document = n.get_content(metadata_mode=MetadataMode.NONE)
-            ids.append(id_)
-            metadatas.append(metadata)
-            documents.append(document)
-        collection.upsert(
-            ids=ids,
-            metadatas=metadatas,
-            documents=documents,
+    def persist_index(self, collection_name):
+        # Persist the index over the populated collection once; ChromaDB has already
+        # committed every upsert, so there is nothing to flush per batch
+        collection = self.get_collection(collection_name)
+        start = time.perf_counter()
+        index = VectorStoreIndex.from_vector_store(
+            ChromaVectorStore(collection), service_context=self.service_context
         )
+        storage_path_index = Path(self.cfg.indices.index.storage_path_root).as_posix()
+        index.storage_context.persist(storage_path_index)
+        indexing_logger.info(
+            f"Persisted index for '{collection_name}' in {time.perf_counter() - start:.1f}s"
+        )
+
+    def update_nodes(self, nodes, collection_name):
+        # Precomputed embeddings keep ChromaDB from re-embedding the documents
+        collection = self.get_collection(collection_name)
+        self.write_nodes(collection, nodes)
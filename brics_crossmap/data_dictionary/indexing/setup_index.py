@@ -4,7 +4,8 @@ setup_index.py
 This script initializes the semantic search pipeline by creating and indexing documents
 from a given data source. It reads from a CSV file, preprocesses the data, creates
 documents, embeds them using a transformer model, and then persists these embeddings
-into a ChromaDB vector store.
+into a ChromaDB vector store. The CSV is streamed in blocks of `csv_block_size` bytes so
+memory use does not grow with the size of the data dictionary.
 
 Prerequisites:
 - A CSV file with the data to be indexed.
@@ -27,12 +28,17 @@ Run the script from the command line using:
 
 Ensure that the configurations in your YAML file are set correctly before execution.
 """
-import pandas as pd
-import chromadb
+
+from pathlib import Path
 
 from brics_crossmap.data_dictionary.indexing.data_preprocessor import DataPreprocessor
 from brics_crossmap.data_dictionary.indexing.document_creator import DocumentCreator
 from brics_crossmap.data_dictionary.indexing.indexer import Indexer
+from brics_crossmap.data_dictionary.indexing.utils import (
+    LAST_UPDATE_HASH_FILE,
+    get_chromadb_client,
+    iter_csv_chunks,
+)
 from brics_crossmap.utils import helper
 from brics_crossmap.data_dictionary.indexing import indexing_logger, log
 
@@ -41,25 +47,39 @@ from brics_crossmap.data_dictionary.indexing import indexing_logger, log
 def main(cfg):
     indexing_logger.info("Starting index setup process.")
 
-    # Load and preprocess the data
-    indexing_logger.info("Loading and preprocessing data dictionary.")
-    df = pd.read_csv(cfg.indices.index.filepath_input, dtype="object")
-    df_clean = DataPreprocessor(cfg).preprocess_data(df)
-
     # Initialize the document creator and the ChromaDB client
     document_creator = DocumentCreator(cfg)
-    client = chromadb.PersistentClient(path=cfg.indices.index.storage_path_root)
+    preprocessor = DataPreprocessor(cfg)
+    client = get_chromadb_client(cfg.indices.index)
     indexing_logger.info("ChromaDB client initialized.")
 
     indexer = Indexer(cfg, client)
 
-    # Iterate over each specified column and create and index documents
+    # Stream the data dictionary in blocks so peak memory stays bounded to one chunk
+    indexing_logger.info("Streaming and indexing data dictionary.")
+    for i, df in enumerate(
+        iter_csv_chunks(
+            cfg.indices.index.filepath_input,
+            block_size=cfg.indices.index.get("csv_block_size") or 64 << 20,
+        )
+    ):
+        df_clean = preprocessor.preprocess_data(df)
+        indexing_logger.info(f"Chunk {i}: {len(df_clean)} of {len(df)} rows to index.")
+
+        # Create and index the chunk's documents for each specified column
+        for col in cfg.indices.index.collections.embed.columns:
+            indexing_logger.info(f"Processing column: {col}")
+            documents = document_creator.create_documents_by_column(df_clean, col)
+            nodes = document_creator.create_nodes_from_documents(documents)
+            indexing_logger.info(f"Adding nodes to the collection: {col}")
+            indexer.add_nodes(nodes, collection_name=col, persist=False)
+
     for col in cfg.indices.index.collections.embed.columns:
-        indexing_logger.info(f"Processing column: {col}")
-        documents = document_creator.create_documents_by_column(df_clean, col)
-        nodes = document_creator.create_nodes_from_documents(documents)
-        indexing_logger.info(f"Adding nodes to the collection: {col}")
-        indexer.add_nodes(nodes, collection_name=col)
+        indexer.persist_index(col)
+    # a rebuilt index hasn't seen any update yet
+    Path(cfg.indices.index.storage_path_root, LAST_UPDATE_HASH_FILE).unlink(
+        missing_ok=True
+    )
 
     # Save the updated configuration to file
     helper.save_config(
@@ -20,6 +20,7 @@ Functions:
 - `DataPreprocessor`: Processes the raw data dictionary CSV to prepare it for indexing.
 - `DocumentCreator`: Generates document objects suitable for embedding and indexing.
 - `Indexer`: Orchestrates the addition of new nodes and updates existing ones within the ChromaDB vector store.
+- `process_column`: Finds the new and changed variables of one collection and builds their nodes.
 
 Execution:
 To execute the script, run the following command:
@@ -27,11 +28,13 @@ To execute the script, run the following command:
     python update_index.py
 
 The script will perform the following operations:
+- Skip the update when the update file and index settings match the fingerprint stored in
+  `{storage_path_root}/.last_update_hash` by the previous run.
 - Load and preprocess the updated data dictionary.
 - Initialize the connection to the ChromaDB vector store.
-- For each specified column in the data dictionary, identify new variables to be added to the vector store and existing variables that need to be updated.
-- Embed and index new variables using the LlamaIndex framework.
-- Directly update existing variables in the vector store using the ChromaDB API (LlamaIndex wrapper doesn't utilize upsert/update functionality).
+- For each specified column in the data dictionary, concurrently identify new variables to be added to the vector store and existing variables that need to be updated.
+- Embed new and updated variables together and upsert them in batches of `max_batch_size` directly through
+  the ChromaDB API (LlamaIndex wrapper doesn't utilize upsert/update functionality).
 
 The update process is vital to maintaining an accurate and efficient semantic search capability, ensuring that
 the vector store remains synchronized with the most recent data dictionary variables.
@@ -40,80 +43,128 @@ Note: The script currently assumes that the ChromaDB update method is available
 the update logic required for maintaining the vector store.
 """
 
-import pandas as pd
-import chromadb
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 
 from brics_crossmap.data_dictionary.indexing.data_preprocessor import DataPreprocessor
 from brics_crossmap.data_dictionary.indexing.document_creator import DocumentCreator
 from brics_crossmap.data_dictionary.indexing.indexer import Indexer
-from brics_crossmap.data_dictionary.indexing.utils import CheckVectorStoreForUpdates
+from brics_crossmap.data_dictionary.indexing.utils import (
+    LAST_UPDATE_HASH_FILE,
+    CheckVectorStoreForUpdates,
+    file_digest,
+    get_chromadb_client,
+    read_csv_strings,
+)
 from brics_crossmap.utils import helper
 from brics_crossmap.data_dictionary.indexing import indexing_logger, log
 
 
-@log(msg="Updating Index")
-def main(cfg):
-    indexing_logger.info("Starting the index update process.")
+def process_column(cfg, df_clean, df_indexed, variable_names, client, col):
+    # Check one collection for new and changed variables and build their nodes
+    indexing_logger.info(f"Processing collection: {col}")
 
-    # Load and preprocess the data
-    indexing_logger.info("Loading and preprocessing the data dictionary.")
-    df = pd.read_csv(cfg.indices.index.filepath_update, dtype="object")
-    df_clean = DataPreprocessor(cfg).preprocess_data(df)
+    # Initialize the check for updates class for the current collection
+    check_updates = CheckVectorStoreForUpdates(
+        df_clean, cfg, client, variable_names=variable_names
+    )
+    check_updates.set_current_collection(col)
 
-    # Initialize the ChromaDB client
-    indexing_logger.info("Initializing the ChromaDB client.")
-    client = chromadb.PersistentClient(path=cfg.indices.index.storage_path_root)
+    # Get the existing metadata from the vector store for the current collection
+    check_updates.get_existing_metadata()
 
-    # Initialize the document creator and indexer
+    # Generate lists of variables to add and update for the current collection
+    variables_to_add = check_updates.get_list_for_add()
+    variables_to_update = check_updates.get_list_for_update()
+
+    indexing_logger.info(
+        f"Found {len(variables_to_add)} variables to add to the collection '{col}': {variables_to_add}"
+    )
+    indexing_logger.info(
+        f"Found {len(variables_to_update)} variables to update in the collection '{col}': {variables_to_update}"
+    )
+
+    # Look up the variables to add and update on the id index and create documents and nodes
     document_creator = DocumentCreator(cfg)
-    indexer = Indexer(cfg, client)
+    df_to_add = df_indexed.loc[df_indexed.index.intersection(variables_to_add)]
+    documents_to_add = document_creator.create_documents_by_column(df_to_add, col)
+    nodes_to_add = document_creator.create_nodes_from_documents(documents_to_add)
 
-    # Iterate over each collection to check for updates and add new documents
-    for col in cfg.indices.index.collections.embed.columns:
-        indexing_logger.info(f"Processing collection: {col}")
+    df_to_update = df_indexed.loc[df_indexed.index.intersection(variables_to_update)]
+    documents_to_update = document_creator.create_documents_by_column(df_to_update, col)
+    nodes_to_update = document_creator.create_nodes_from_documents(documents_to_update)
+    return nodes_to_add + nodes_to_update
 
-        # Initialize the check for updates class for the current collection
-        check_updates = CheckVectorStoreForUpdates(df_clean, cfg, client)
-        check_updates.set_current_collection(col)
 
-        # Get the existing metadata from the vector store for the current collection
-        existing_metadata = check_updates.get_existing_metadata()
+def update_fingerprint(cfg):
+    # Fingerprint of the update file and the settings deciding what gets indexed from it
+    index_cfg = cfg.indices.index
+    key = {
+        "filepath_update": file_digest(index_cfg.filepath_update),
+        "model_name": index_cfg.collections.embed.model_name,
+        "columns": list(index_cfg.collections.embed.columns),
+        "metadata_columns": list(index_cfg.collections.metadata_columns),
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
 
-        # Generate lists of variables to add and update for the current collection
-        variables_to_add = check_updates.get_list_for_add()
-        variables_to_update = check_updates.get_list_for_update()
 
+@log(msg="Updating Index")
+def main(cfg):
+    indexing_logger.info("Starting the index update process.")
+
+    # Skip the metadata fetch and diff entirely when this exact update was already applied
+    fp_update_hash = Path(cfg.indices.index.storage_path_root, LAST_UPDATE_HASH_FILE)
+    update_hash = update_fingerprint(cfg)
+    if fp_update_hash.is_file() and fp_update_hash.read_text().strip() == update_hash:
         indexing_logger.info(
-            f"Found {len(variables_to_add)} variables to add to the collection '{col}': {variables_to_add}"
-        )
-        indexing_logger.info(
-            f"Found {len(variables_to_update)} variables to update in the collection '{col}': {variables_to_update}"
+            "Update file unchanged since the last update; nothing to index."
         )
+        return
 
-        # Filter the DataFrame for variables to add and create documents and nodes
-        df_to_add = df_clean[
-            df_clean[cfg.indices.index.collections.embed.id_column].isin(
-                variables_to_add
-            )
-        ]
-        documents_to_add = document_creator.create_documents_by_column(df_to_add, col)
-        nodes_to_add = document_creator.create_nodes_from_documents(documents_to_add)
-        indexer.add_nodes(nodes_to_add, collection_name=col)
-
-        # Filter the DataFrame for variables to update and create documents and nodes
-        df_to_update = df_clean[
-            df_clean[cfg.indices.index.collections.embed.id_column].isin(
-                variables_to_update
-            )
-        ]
-        documents_to_update = document_creator.create_documents_by_column(
-            df_to_update, col
-        )
-        nodes_to_update = document_creator.create_nodes_from_documents(
-            documents_to_update
-        )
-        indexer.update_nodes(nodes_to_update, collection_name=col)
+    # Load and preprocess the data
+    indexing_logger.info("Loading and preprocessing the data dictionary.")
+    df = read_csv_strings(cfg.indices.index.filepath_update)
+    preprocessor = DataPreprocessor(cfg)
+    df_clean = preprocessor.parse_dates(preprocessor.preprocess_data(df))
+    # index by variable and extract the variable names once, shared by every collection
+    id_column = cfg.indices.index.collections.embed.id_column
+    df_indexed = df_clean.set_index(id_column, drop=False)
+    variable_names = df_clean[id_column].to_numpy(dtype=object)
 
+    # Initialize the ChromaDB client
+    indexing_logger.info("Initializing the ChromaDB client.")
+    client = get_chromadb_client(cfg.indices.index)
+
+    # Check every collection concurrently (metadata fetch + diff + node creation)
+    # while the indexer loads its embedding model
+    columns = list(cfg.indices.index.collections.embed.columns)
+    with ThreadPoolExecutor(max_workers=len(columns)) as executor:
+        futures = {
+            col: executor.submit(
+                process_column, cfg, df_clean, df_indexed, variable_names, client, col
+            )
+            for col in columns
+        }
+        indexer = Indexer(cfg, client)
+
+        # Embed on this thread as each collection's nodes become ready. New and changed
+        # variables are both upserts, so write them as one stream of max_batch_size
+        # requests and persist the collection's index once. No pre-sorting is needed:
+        # the indexer orders the nodes by text length before batching them for the
+        # embedder, which in turn batches each call by token length
+        for col, future in futures.items():
+            nodes = future.result()
+            if nodes:
+                indexing_logger.info(
+                    f"Upserting {len(nodes)} nodes into '{col}' in batches of "
+                    f"{cfg.indices.index.collections.max_batch_size}"
+                )
+                indexer.add_nodes(nodes, collection_name=col)
+
+    fp_update_hash.write_text(update_hash)
     indexing_logger.info("Index update process completed successfully.")
 
 
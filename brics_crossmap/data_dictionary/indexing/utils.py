@@ -1,58 +1,166 @@
+import hashlib
+from itertools import islice
 from typing import List, Optional
+import chromadb
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
+
+from brics_crossmap.data_dictionary.indexing.data_preprocessor import (
+    PARSED_DATE_COLUMN,
+    parse_change_dates,
+)
 
 
 def batchify(data, batch_size):
-    """Yield successive batch-sized chunks from data."""
-    for i in range(0, len(data), batch_size):
-        yield data[i : i + batch_size]
+    """Yield successive batch-sized chunks from data.
+
+    Arrays and pandas objects are yielded as positional slices (views), any other
+    iterable, including generators, lazily as lists.
+    """
+    if isinstance(data, np.ndarray):
+        for i in range(0, len(data), batch_size):
+            yield data[i : i + batch_size]
+    elif isinstance(data, (pd.DataFrame, pd.Series)):
+        for i in range(0, len(data), batch_size):
+            yield data.iloc[i : i + batch_size]
+    else:
+        it = iter(data)
+        while batch := list(islice(it, batch_size)):
+            yield batch
+
+
+def _string_csv_options(filepath):
+    """Arrow CSV parse/convert options reading every column of filepath as text."""
+    column_names = pd.read_csv(filepath, nrows=0).columns.tolist()
+    # quoted fields such as definitions may span lines
+    parse_options = pacsv.ParseOptions(newlines_in_values=True)
+    # keep every field as text, with empty fields as missing
+    convert_options = pacsv.ConvertOptions(
+        column_types={c: pa.string() for c in column_names},
+        strings_can_be_null=True,
+    )
+    return parse_options, convert_options
+
+
+def _to_string_frame(table):
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+
+def iter_csv_chunks(filepath, block_size=64 << 20):
+    """Stream a CSV as DataFrames of Arrow-backed string columns, one block at a time."""
+    parse_options, convert_options = _string_csv_options(filepath)
+    reader = pacsv.open_csv(
+        filepath,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        parse_options=parse_options,
+        convert_options=convert_options,
+    )
+    for batch in reader:
+        yield _to_string_frame(batch)
+
+
+def read_csv_strings(filepath):
+    """Read a whole CSV with Arrow's multithreaded parser into Arrow-backed string columns."""
+    parse_options, convert_options = _string_csv_options(filepath)
+    table = pacsv.read_csv(
+        filepath, parse_options=parse_options, convert_options=convert_options
+    )
+    return _to_string_frame(table)
+
+
+# marker in storage_path_root holding the fingerprint of the last applied update
+LAST_UPDATE_HASH_FILE = ".last_update_hash"
+
+
+def file_digest(filepath, chunk_size=1 << 20):
+    """Hex BLAKE2b digest of a file's bytes, read in chunk_size blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_chromadb_client(index_cfg):
+    """Connect to the Chroma server at `chroma_server.host` if one is configured, else open the
+    local store at `storage_path_root`."""
+    server = index_cfg.get("chroma_server") or {}
+    if server.get("host"):
+        # the server owns the SQLite/HNSW writes, so concurrent upserts pipeline over HTTP
+        return chromadb.HttpClient(
+            host=server.get("host"),
+            port=str(server.get("port") or 8000),
+            ssl=bool(server.get("ssl")),
+        )
+    return chromadb.PersistentClient(path=index_cfg.storage_path_root)
 
 
 class CheckVectorStoreForUpdates:
-    def __init__(self, data_df, config, chromadb_client):
+    def __init__(self, data_df, config, chromadb_client, variable_names=None):
         self.data_df = data_df  # Directly using the passed DataFrame
         self.cfg = config
+        # Incoming variable names as an object array; pass one in to share it across collections
+        if variable_names is None:
+            variable_names = data_df[
+                config.indices.index.collections.embed.id_column
+            ].to_numpy(dtype=object)
+        self.variable_names = variable_names
         self.chromadb_client = chromadb_client
         self.current_metadata = None
         self.current_collection = None
+        self.existing = None
+        self._chroma_dates = None
 
     def set_current_collection(self, collection_name):
         # Fetch existing metadata from the ChromaDB vector store
         self.current_collection = self.chromadb_client.get_collection(collection_name)
         return self.current_collection
 
+    def iter_existing_metadata(self, page_size=10000):
+        # Page through the collection's metadata, keeping only the fields the checks use
+        offset = 0
+        while True:
+            page = self.current_collection.get(
+                include=["metadatas"], limit=page_size, offset=offset
+            )["metadatas"]
+            if not page:
+                break
+            for meta in page:
+                yield meta["variable name"], meta.get("last change date")
+            offset += page_size
+
     def get_existing_metadata(self):
-        # Fetch existing metadata from the ChromaDB vector store
-        self.current_metadata = self.current_collection.get(include=["metadatas"])[
-            "metadatas"
-        ]
+        # Fetch existing variable names and change dates from the ChromaDB vector store
+        self.current_metadata = pd.DataFrame(
+            self.iter_existing_metadata(),
+            columns=["variable name", "last change date"],
+        )
+        # Variable names already in the collection, shared by the add/update checks
+        self.existing = self.current_metadata["variable name"].to_numpy(dtype=object)
+        # Parsed change date of each stored variable, keyed by variable name
+        dates = parse_change_dates(self.current_metadata["last change date"])
+        dates = dates.set_axis(self.current_metadata["variable name"]).dropna()
+        self._chroma_dates = dates[~dates.index.duplicated(keep="last")]
         return self.current_metadata
 
     def get_list_for_add(self):
         # Determine which variables do not exist in ChromaDB and need to be upserted
-        variable_names_df = set(
-            self.data_df[self.cfg.indices.index.collections.embed.id_column].tolist()
-        )
-        existing_variable_names = set(
-            meta["variable name"] for meta in self.current_metadata
-        )
-        new_variables_to_add = variable_names_df - existing_variable_names
-        return list(new_variables_to_add)
+        return np.setdiff1d(self.variable_names, self.existing).tolist()
 
     def get_list_for_update(self):
         # Determine which variables exist in ChromaDB and need to be updated
-        variables_to_update = []
-        chromadb_variables = {
-            meta["variable name"]: meta["last change date"]
-            for meta in self.current_metadata
-            if "last change date" in meta and "variable name" in meta
-        }
-
-        for _, row in self.data_df.iterrows():
-            variable_name = row[self.cfg.indices.index.collections.embed.id_column]
-            if variable_name in chromadb_variables:
-                if pd.to_datetime(row["last change date"]) > pd.to_datetime(
-                    chromadb_variables[variable_name]
-                ):
-                    variables_to_update.append(variable_name)
-        return variables_to_update
+        id_column = self.cfg.indices.index.collections.embed.id_column
+
+        # Only variables already in the collection can need an update
+        df_existing = self.data_df[np.isin(self.variable_names, self.existing)]
+
+        # Compare the incoming dates, parsed once by DataPreprocessor.parse_dates, with the
+        # stored ones looked up by variable name; unmatched variables compare as NaT
+        if PARSED_DATE_COLUMN in df_existing:
+            dates_new = df_existing[PARSED_DATE_COLUMN]
+        else:
+            dates_new = parse_change_dates(df_existing["last change date"])
+        dates_old = self._chroma_dates.reindex(df_existing[id_column].astype(object))
+        return df_existing.loc[dates_new.array > dates_old.array, id_column].tolist()
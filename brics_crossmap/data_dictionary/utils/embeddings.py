@@ -0,0 +1,276 @@
+"""
+
+Sentence-transformer embedding helpers shared by indexing and crossmapping.
+
+"""
+
+import json
+from abc import abstractmethod
+from pathlib import Path
+
+import numpy as np
+import torch
+from langchain.embeddings.base import Embeddings
+from sentence_transformers import SentenceTransformer
+
+
+def resolve_torch_dtype(torch_dtype, device):
+    """torch dtype named by torch_dtype; when unset, bfloat16 on GPU and float32 on CPU, where
+    bf16 matmuls are slower than fp32 without AVX512-BF16/AMX"""
+
+    if not torch_dtype:
+        torch_dtype = "bfloat16" if str(device).startswith("cuda") else "float32"
+    return getattr(torch, torch_dtype)
+
+
+def load_sentence_transformer(model_name, device="cpu", torch_dtype=None):
+    """Load a SentenceTransformer with its transformer weights cast to torch_dtype"""
+
+    model = SentenceTransformer(model_name, device=device)
+    # only the transformer runs in reduced precision, pooling/dense heads stay fp32
+    model[0].to(resolve_torch_dtype(torch_dtype, device))
+    model.eval()
+    return model
+
+
+def encode_texts(model, texts, batch_size=32, normalize_embeddings=True):
+    """Embed texts with a single tokenizer call and return an (N, D) float32 array"""
+
+    if len(texts) == 0:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    features = model.tokenize(list(texts))
+    # embed in token-length order so each batch pads to near-uniform length
+    order = np.argsort(features["attention_mask"].sum(dim=1).numpy(), kind="stable")
+    features = {k: v[order] for k, v in features.items()}
+    transformer, heads = model[0], list(model)[1:]
+    embeddings = []
+    with torch.inference_mode():
+        for start in range(0, len(texts), batch_size):
+            batch = {k: v[start : start + batch_size] for k, v in features.items()}
+            # drop the padding only needed by longer texts outside this batch
+            seq_len = int(batch["attention_mask"].sum(dim=1).max())
+            batch = {k: v[:, :seq_len].to(model.device) for k, v in batch.items()}
+            out = transformer(batch)
+            # upcast the hidden state before pooling/normalizing
+            out["token_embeddings"] = out["token_embeddings"].float()
+            for module in heads:
+                out = module(out)
+            emb = out["sentence_embedding"]
+            if normalize_embeddings:
+                emb = torch.nn.functional.normalize(emb, p=2, dim=1)
+            embeddings.append(emb.cpu().numpy())
+    return np.concatenate(embeddings)[np.argsort(order)]
+
+
+class ArrayEmbeddings(Embeddings):
+    """LangChain embeddings built on an `encode` method returning an (N, D) array"""
+
+    @abstractmethod
+    def encode(self, texts):
+        """Embed texts and return an (N, D) float32 array"""
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class SentenceTransformerEmbeddings(ArrayEmbeddings):
+    """LangChain embeddings backed by `encode_texts`, usable with LlamaIndex's LangchainEmbedding"""
+
+    def __init__(self, model, batch_size=32, normalize_embeddings=True):
+        self.model = model
+        self.batch_size = batch_size
+        self.normalize_embeddings = normalize_embeddings or st_cfg["normalize"]
+
+    def encode(self, texts):
+        return encode_texts(
+            self.model,
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize_embeddings,
+        )
+
+
+class ChromaEmbeddingFunction:
+    """ChromaDB embedding function sharing an already loaded `ArrayEmbeddings` model"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def __call__(self, texts):
+        return self.embeddings.encode(texts).tolist()
+
+
+def export_onnx_int8(model_name, onnx_dir):
+    """Export a model to ONNX and dynamically quantize it to int8 (AVX512-VNNI) in onnx_dir"""
+
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    model.save_pretrained(onnx_dir)
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantizer.quantize(
+        save_dir=onnx_dir,
+        quantization_config=AutoQuantizationConfig.avx512_vnni(
+            is_static=False, per_channel=False
+        ),
+    )
+
+
+def read_model_json(model_name, filename):
+    """Parse a JSON file of a local or Hub model, None if the model has no such file"""
+
+    if Path(model_name).is_dir():
+        fp = Path(model_name, filename)
+        if not fp.is_file():
+            return None
+    else:
+        from huggingface_hub import hf_hub_download
+        from huggingface_hub.utils import EntryNotFoundError
+
+        try:
+            fp = hf_hub_download(model_name, filename)
+        except EntryNotFoundError:
+            return None
+    with open(fp) as f:
+        return json.load(f)
+
+
+def read_sentence_transformer_config(model_name):
+    """Pooling ('mean' or 'cls'), Normalize head and max_seq_length of a sentence-transformers model.
+
+    Models without `modules.json` get sentence-transformers' mean pooling fallback. Modules other
+    than Transformer, Pooling and Normalize (e.g. a Dense head) are rejected.
+    """
+
+    modules = read_model_json(model_name, "modules.json") or []
+    pooling, normalize = "mean", False
+    for module in modules:
+        module_type = module["type"].rsplit(".", 1)[-1]
+        if module_type == "Pooling":
+            pooling_cfg = read_model_json(model_name, f"{module['path']}/config.json")
+            modes = [
+                k for k, v in pooling_cfg.items() if k.startswith("pooling_mode_") and v
+            ]
+            supported = {
+                "pooling_mode_mean_tokens": "mean",
+                "pooling_mode_cls_token": "cls",
+            }
+            if len(modes) != 1 or modes[0] not in supported:
+                raise ValueError(
+                    f"{model_name} pools with {modes}, only mean or CLS pooling is supported"
+                )
+            pooling = supported[modes[0]]
+        elif module_type == "Normalize":
+            normalize = True
+        elif module_type != "Transformer":
+            raise ValueError(
+                f"{model_name} has a {module_type} module, only Transformer, Pooling and "
+                "Normalize modules are supported"
+            )
+    st_cfg = read_model_json(model_name, "sentence_bert_config.json") or {}
+    return {
+        "pooling": pooling,
+        "normalize": normalize,
+        "max_seq_length": st_cfg.get("max_seq_length"),
+    }
+
+
+class OnnxInt8Embeddings(ArrayEmbeddings):
+    """LangChain embeddings running an int8-quantized ONNX export of the model on CPU.
+
+    Pooling, the Normalize head and max_seq_length follow the model's sentence-transformers
+    config, so vectors match the torch backend up to quantization error.
+    """
+
+    def __init__(self, model_name, onnx_dir, batch_size=32, normalize_embeddings=True):
+        import onnxruntime
+        from transformers import AutoConfig, AutoTokenizer
+
+        # fail on unsupported models before paying for the export
+        st_cfg = read_sentence_transformer_config(model_name)
+        fp_onnx = Path(onnx_dir, "model_quantized.onnx")
+        if not fp_onnx.is_file():
+            export_onnx_int8(model_name, onnx_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.pooling = st_cfg["pooling"]
+        # same fallback as sentence-transformers when the model doesn't set max_seq_length
+        self.max_seq_length = st_cfg["max_seq_length"] or min(
+            AutoConfig.from_pretrained(model_name).max_position_embeddings,
+            self.tokenizer.model_max_length,
+        )
+        self.session = onnxruntime.InferenceSession(
+            fp_onnx.as_posix(), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.batch_size = batch_size
+        self.normalize_embeddings = normalize_embeddings
+
+    def encode(self, texts):
+        if len(texts) == 0:
+            return np.empty((0, self.session.get_outputs()[0].shape[-1]), np.float32)
+
+        features = self.tokenizer(
+            list(texts),
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        features = {k: v for k, v in features.items() if k in self.input_names}
+        # embed in token-length order so each batch pads to near-uniform length
+        order = np.argsort(features["attention_mask"].sum(axis=1), kind="stable")
+        features = {k: v[order] for k, v in features.items()}
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = {k: v[start : start + self.batch_size] for k, v in features.items()}
+            # drop the padding only needed by longer texts outside this batch
+            seq_len = int(batch["attention_mask"].sum(axis=1).max())
+            batch = {k: v[:, :seq_len] for k, v in batch.items()}
+            token_embeddings = self.session.run(None, batch)[0]
+            if self.pooling == "cls":
+                emb = token_embeddings[:, 0]
+            else:
+                mask = batch["attention_mask"][..., None].astype(np.float32)
+                emb = (token_embeddings * mask).sum(axis=1) / np.clip(
+                    mask.sum(axis=1), 1e-9, None
+                )
+            if self.normalize_embeddings:
+                emb = emb / np.linalg.norm(emb, axis=1, keepdims=True)
+            embeddings.append(emb.astype(np.float32))
+        return np.concatenate(embeddings)[np.argsort(order)]
+
+
+def load_embeddings(embed_cfg):
+    """Build the embedding model described by an `embed` config section.
+
+    Without a configured `model_kwargs.batch_size`, batches default to 256 texts on GPU and 32 on CPU.
+    """
+
+    device = embed_cfg.model_kwargs.get("device") or "cpu"
+    if embed_cfg.get("backend", "torch") == "onnx-int8":
+        onnx_dir = embed_cfg.get("onnx_dir") or Path(
+            Path.home(), ".cache", "brics_crossmap", "onnx-int8", embed_cfg.model_name
+        )
+        return OnnxInt8Embeddings(
+            embed_cfg.model_name,
+            onnx_dir,
+            batch_size=embed_cfg.model_kwargs.get("batch_size") or 32,
+            normalize_embeddings=embed_cfg.model_kwargs.normalize_embeddings,
+        )
+
+    model = load_sentence_transformer(
+        embed_cfg.model_name,
+        device=device,
+        torch_dtype=embed_cfg.get("torch_dtype"),
+    )
+    return SentenceTransformerEmbeddings(
+        model,
+        batch_size=embed_cfg.model_kwargs.get("batch_size")
+        or (256 if str(device).startswith("cuda") else 32),
+        normalize_embeddings=embed_cfg.model_kwargs.normalize_embeddings,
+    )
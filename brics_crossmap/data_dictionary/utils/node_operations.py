@@ -17,17 +17,34 @@ class DummyNodePostprocessor:
         return nodes
 
 
+# keys added by llama_index's node_to_metadata_dict on top of the node metadata
+NODE_METADATA_KEYS = (
+    "_node_content",
+    "_node_type",
+    "document_id",
+    "doc_id",
+    "ref_doc_id",
+)
+
+
+def chroma_metadata_to_result(metadata):
+    # mirrors node_results_to_dataframe for metadata returned directly by chromadb
+    result_dict = {"node_id": metadata.get("document_id")}
+    result_dict.update(
+        {k: v for k, v in metadata.items() if k not in NODE_METADATA_KEYS}
+    )
+    return result_dict
+
+
 def node_results_to_dataframe(results):
-    source_nodes = results.source_nodes
-    results = []
-    for node in source_nodes:
-        result_dict = {}
-        node_dict = node.dict()
-        node_score = {"score": node_dict["score"]}
-        node_info = node_dict["node"]["relationships"]["1"]
-        node_id = {"node_id": node_info["node_id"]}
-        node_meta = node_info["metadata"]
-        result_dict = {**node_id, **node_meta, **node_score}
-        results.append(result_dict)
-    df_results = pd.DataFrame(results)
-    return df_results
+    # read the source document's id/metadata off each node directly instead of
+    # serializing the whole node with .dict()
+    rows = [
+        {
+            "node_id": node.node.source_node.node_id,
+            **node.node.source_node.metadata,
+            "score": node.score,
+        }
+        for node in results.source_nodes
+    ]
+    return pd.DataFrame.from_records(rows)
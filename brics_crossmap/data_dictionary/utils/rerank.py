@@ -0,0 +1,96 @@
+"""
+
+Cross-encoder reranking of semantic search candidates.
+
+"""
+
+import numpy as np
+import torch
+from sentence_transformers import CrossEncoder
+from tqdm import tqdm
+
+from brics_crossmap.data_dictionary.utils.embeddings import resolve_torch_dtype
+
+
+def load_cross_encoder(model_name, device="cpu", torch_dtype=None):
+    """Load a CrossEncoder on device with its weights cast to torch_dtype (see `resolve_torch_dtype`)"""
+
+    cross_encoder = CrossEncoder(model_name, device=device)
+    cross_encoder.model.to(
+        device=device, dtype=resolve_torch_dtype(torch_dtype, device)
+    )
+    cross_encoder.model.eval()
+    return cross_encoder
+
+
+def predict_pairs(cross_encoder, pairs, batch_size=256, show_progress_bar=True):
+    """Score (query, document) pairs with a single tokenizer call and return float32 sigmoid scores"""
+
+    if len(pairs) == 0:
+        return np.empty(0, dtype=np.float32)
+
+    queries, docs = map(list, zip(*pairs))
+    features = cross_encoder.tokenizer(
+        queries,
+        docs,
+        padding=True,
+        truncation="longest_first",
+        max_length=cross_encoder.max_length,
+        return_tensors="pt",
+    )
+    device = cross_encoder.model.device
+    scores = []
+    with torch.inference_mode():
+        for start in tqdm(
+            range(0, len(pairs), batch_size), disable=not show_progress_bar
+        ):
+            batch = {k: v[start : start + batch_size] for k, v in features.items()}
+            # drop the padding only needed by longer pairs outside this batch
+            seq_len = int(batch["attention_mask"].sum(dim=1).max())
+            batch = {k: v[:, :seq_len].to(device) for k, v in batch.items()}
+            logits = cross_encoder.model(**batch, return_dict=True).logits
+            scores.append(torch.sigmoid(logits.float()).squeeze(-1).cpu().numpy())
+    return np.concatenate(scores)
+
+
+def rerank_candidates(
+    cross_encoder, queries, candidates, top_n, batch_size=None, max_chars=512
+):
+    """Score every (query, candidate) pair in one cross-encoder pass and keep the top_n per query.
+
+    Args:
+        cross_encoder (CrossEncoder): Loaded sentence-transformers cross-encoder.
+        queries (List[str]): Query texts.
+        candidates (List[List[str]]): Retrieved candidate documents for each query.
+        top_n (int): Number of candidates to keep per query.
+        batch_size (int): Number of pairs per cross-encoder forward pass. Defaults to 256 on GPU
+            and 32 on CPU.
+        max_chars (int): Character cap applied to candidate documents to bound tokenization cost.
+
+    Returns:
+        np.ndarray: Positions of the kept candidates in the flattened candidate list,
+        grouped by query and best first within each query.
+        np.ndarray: Cross-encoder scores of the kept candidates.
+    """
+
+    if batch_size is None:
+        batch_size = 256 if cross_encoder.model.device.type == "cuda" else 32
+    pairs = [
+        (query, doc[:max_chars])
+        for query, docs in zip(queries, candidates)
+        for doc in docs
+    ]
+    scores = predict_pairs(cross_encoder, pairs, batch_size=batch_size)
+
+    # select each query's top_n in O(k) and sort only the kept scores
+    offsets = np.cumsum([0] + [len(docs) for docs in candidates])
+    positions = []
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        neg_scores = -scores[start:end]
+        if top_n < len(neg_scores):
+            idx = np.argpartition(neg_scores, top_n)[:top_n]
+        else:
+            idx = np.arange(len(neg_scores))
+        positions.append(start + idx[np.argsort(neg_scores[idx], kind="stable")])
+    positions = np.concatenate(positions) if positions else np.empty(0, dtype=int)
+    return positions, scores[positions]
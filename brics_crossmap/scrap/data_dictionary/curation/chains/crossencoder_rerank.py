@@ -11,6 +11,7 @@ from scrap.setup_chromadb.fitbir.data_dictionary.utils import (
 )
 from brics_crossmap.utils import helper
 from brics_crossmap.data_dictionary.crossmap import crossmap_logger, log, copy_log
+from brics_crossmap.data_dictionary.utils.rerank import predict_pairs
 from pathlib import Path
 
 
@@ -27,15 +28,12 @@ def run_curation(cfg, **kwargs):
     fp_cur = "C:/Users/armengolkm/Desktop/Full Pipeline Test v1.1.0/LLM_tests/DE_Step-1_Hydra-search (1)/DE_Step-1_curation_keepCol.csv"
     df_cur = pd.read_csv(fp_cur, dtype="object")
 
-    df_cur.loc[
-        df_cur["pipeline_name"]
-        == "hybrid_semantic_search (custom=title_def, alpha=[1.0, 0.5, 0.0])",
-        "pipeline_name",
-    ] = df_cur.loc[
-        df_cur["pipeline_name"]
-        == "hybrid_semantic_search (custom=title_def, alpha=[1.0, 0.5, 0.0])",
-        "pipeline_name_alpha",
-    ]  # TODO: temp fix
+    mask = df_cur["pipeline_name"].eq(
+        "hybrid_semantic_search (custom=title_def, alpha=[1.0, 0.5, 0.0])"
+    )
+    df_cur.loc[mask, "pipeline_name"] = df_cur.loc[
+        mask, "pipeline_name_alpha"
+    ].to_numpy()  # TODO: temp fix
 
     cols_include = [
         "variable name",
@@ -69,32 +67,43 @@ def run_curation(cfg, **kwargs):
     df_cur.to_csv(Path(output_dir, "curation_semantic-search.csv"), index=False)
 
     # LOAD CROSS ENCODER MODEL
+    # FP16 on GPU; BF16 on CPU, which has native BF16 matmul on recent x86
     model_name = "cross-encoder/stsb-distilroberta-base"
-    crossencoder = CrossEncoder(model_name)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    torch_dtype = torch.float16 if device == "cuda" else torch.bfloat16
+    crossencoder = CrossEncoder(
+        model_name, device=device, automodel_args={"torch_dtype": torch_dtype}
+    )
 
     # EMBED + SEMANTIC SEARCH + CROSS ENCODER RERANKING
-    dfs_to_concat = []  # list to store processed DataFrame chunks
-
-    # Group by variable name, pipeline name, search_ID
-    groups = df_cur.groupby(["variable name", "pipeline_name", "search_ID"])
     query_col = "query_term_1"
     result_col = "data element concept names"
 
-    for name, group in groups:
-        query = group[query_col].iloc[0]
-        cross_encoder_input = [[query, result] for result in group[result_col]]
-        cross_encoder_score = crossencoder.predict(cross_encoder_input)
-        group[f"cross_encoder_score"] = cross_encoder_score
-        dfs_to_concat.append(group)  # add the processed group to the list
-
-    # Combine all chunks into a single DataFrame
-    result_df = pd.concat(dfs_to_concat)
-    result_df = result_df.sort_values(
-        by=["variable name", "pipeline_name", "search_ID", "cross_encoder_score"],
+    # Pair every result with the query of its variable name, pipeline name, search_ID group
+    queries = df_cur.groupby(
+        ["variable name", "pipeline_name", "search_ID"], dropna=False
+    )[query_col].transform("first")
+    cross_encoder_input = list(zip(queries, df_cur[result_col]))
+
+    # Score all pairs in one batched pass rather than one call per group; predict_pairs
+    # tokenizes every (query, result) pair in a single fast-tokenizer call and feeds the
+    # model directly, upcasting the logits since numpy has no BF16 dtype
+    with torch.autocast(device_type=device, dtype=torch_dtype):
+        df_cur["cross_encoder_score"] = predict_pairs(
+            crossencoder, cross_encoder_input, batch_size=128
+        )
+    # Order and dedupe the scored frame in place rather than through a copy; the group keys
+    # become categoricals (lexically ordered categories) so sorting and hashing run on codes
+    group_cols = ["variable name", "pipeline_name", "search_ID"]
+    df_cur[group_cols] = df_cur[group_cols].astype("category")
+    df_cur.sort_values(
+        by=[*group_cols, "cross_encoder_score"],
         ascending=[True, True, True, False],
+        kind="stable",
+        inplace=True,
     )
-    result_df.drop_duplicates(inplace=True)
-    result_df.to_csv(
+    df_cur.drop_duplicates(inplace=True)
+    df_cur.to_csv(
         Path(output_dir, "curation_semantic-search_crossencoder.csv"), index=False
     )
 